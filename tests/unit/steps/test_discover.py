@@ -0,0 +1,210 @@
+import os
+import datetime
+import subprocess
+from types import SimpleNamespace
+
+import fmf
+import pytest
+
+import tmt
+import tmt.plugins
+from tmt.steps.discover.fmf import _dependency_key, _find_git_root
+
+# Load all plugins
+tmt.plugins.explore()
+
+# Ignore loading/saving from/to workdir
+tmt.steps.discover.Discover.load = lambda self: None
+tmt.steps.discover.Discover.save = lambda self: None
+
+
+def git(*args, cwd):
+    """ Run git command with a fixed identity, return stdout """
+    return subprocess.run(
+        ['git', '-c', 'user.name=tmt', '-c', 'user.email=tmt@example.com']
+        + list(args), cwd=cwd, check=True, universal_newlines=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.strip()
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """ Git repository with the 'old' test, 'new' added in next commit """
+    repo = tmp_path / 'origin'
+    (repo / '.fmf').mkdir(parents=True)
+    (repo / '.fmf' / 'version').write_text('1\n')
+    (repo / 'old.fmf').write_text('test: ./old.sh\n')
+    git('init', '--quiet', cwd=repo)
+    git('checkout', '--quiet', '-b', 'master', cwd=repo)
+    git('add', '.', cwd=repo)
+    git('commit', '--quiet', '-m', 'old', cwd=repo)
+    first = git('rev-parse', 'HEAD', cwd=repo)
+    (repo / 'new.fmf').write_text('test: ./new.sh\n')
+    git('add', '.', cwd=repo)
+    git('commit', '--quiet', '-m', 'new', cwd=repo)
+    return f'file://{repo}', first
+
+
+def discover(tmp_path, **data):
+    """ Prepare discover fmf plugin with given data in a temporary workdir """
+    plan = tmt.Plan(fmf.Tree({
+        'execute': {'how': 'tmt'},
+        'discover': dict(how='fmf', **data)}))
+    plan._fmf_context = lambda: dict()
+    plan.discover.wake()
+    plugin = plan.discover.plugins()[0]
+    plugin._workdir = str(tmp_path / 'workdir')
+    os.makedirs(plugin._workdir)
+    return plugin
+
+
+def names(plugin):
+    """ Sorted names of discovered tests """
+    return sorted(test.name for test in plugin.tests())
+
+
+def log(plugin):
+    """ Content of the plugin log """
+    with open(os.path.join(plugin.workdir, 'log.txt')) as log:
+        return log.read()
+
+
+def test_clone_full(tmp_path, origin):
+    """ Full history is cloned by default """
+    url, _ = origin
+    plugin = discover(tmp_path, url=url)
+    plugin.go()
+    testdir = os.path.join(plugin.workdir, 'tests')
+    assert git('rev-parse', '--is-shallow-repository', cwd=testdir) == 'false'
+    assert names(plugin) == ['/new', '/old']
+
+
+def test_clone_shallow(tmp_path, origin):
+    """ Shallow clone contains the requested branch only """
+    url, _ = origin
+    plugin = discover(tmp_path, url=url, shallow=True)
+    plugin.go()
+    testdir = os.path.join(plugin.workdir, 'tests')
+    assert git('rev-parse', '--is-shallow-repository', cwd=testdir) == 'true'
+    assert git('rev-list', '--count', 'HEAD', cwd=testdir) == '1'
+    assert names(plugin) == ['/new', '/old']
+
+
+def test_clone_shallow_checkout(tmp_path, origin):
+    """ Branch checked out by the shallow clone is still reported """
+    url, _ = origin
+    plugin = discover(tmp_path, url=url, shallow=True)
+    plugin.go()
+    assert "Checkout ref 'master' done by the clone." in log(plugin)
+    assert 'git checkout' not in log(plugin)
+
+
+def test_clone_shallow_commit(tmp_path, origin):
+    """ Commit falls back to the full clone and is checked out """
+    url, first = origin
+    plugin = discover(tmp_path, url=url, ref=first, shallow=True)
+    plugin.go()
+    testdir = os.path.join(plugin.workdir, 'tests')
+    assert 'Shallow clone failed, fetching full history.' in log(plugin)
+    assert f"Checkout ref '{first}'." in log(plugin)
+    assert git('rev-parse', '--is-shallow-repository', cwd=testdir) == 'false'
+    assert git('rev-parse', 'HEAD', cwd=testdir) == first
+    assert names(plugin) == ['/old']
+
+
+@pytest.fixture
+def requires(tmp_path):
+    """ Git repository with tests requiring beakerlib libraries """
+    repo = tmp_path / 'requires'
+    (repo / '.fmf').mkdir(parents=True)
+    (repo / '.fmf' / 'version').write_text('1\n')
+    (repo / 'one.fmf').write_text('test: ./one.sh\nrequire: [wget, curl]\n')
+    (repo / 'two.fmf').write_text('test: ./two.sh\nrequire: [curl, wget]\n')
+    (repo / 'broken.fmf').write_text('test: ./broken.sh\nrequire: [broken]\n')
+    git('init', '--quiet', cwd=repo)
+    git('checkout', '--quiet', '-b', 'master', cwd=repo)
+    git('add', '.', cwd=repo)
+    git('commit', '--quiet', '-m', 'requires', cwd=repo)
+    return f'file://{repo}'
+
+
+def test_dependencies_failure(tmp_path, requires, monkeypatch):
+    """ Library failure is raised from discover """
+    def dependencies(require, recommend=None, parent=None):
+        if 'broken' in require:
+            raise tmt.utils.GeneralError('Broken library.')
+        return require, recommend or [], []
+
+    monkeypatch.setattr(tmt.beakerlib, 'dependencies', dependencies)
+    plugin = discover(tmp_path, url=requires)
+    with pytest.raises(tmt.utils.GeneralError, match='Broken library'):
+        plugin.go()
+
+
+def test_dependencies_once(tmp_path, requires, monkeypatch):
+    """ Identical requires are resolved only once """
+    calls = []
+
+    def dependencies(require, recommend=None, parent=None):
+        calls.append(sorted(require))
+        return require, recommend or [], []
+
+    monkeypatch.setattr(tmt.beakerlib, 'dependencies', dependencies)
+    plugin = discover(tmp_path, url=requires)
+    plugin.go()
+    assert sorted(calls) == [['broken'], ['curl', 'wget']]
+    one, two = [
+        test for test in plugin.tests() if test.name in ['/one', '/two']]
+    assert sorted(one.require) == sorted(two.require) == ['curl', 'wget']
+    assert one.require is not two.require
+
+
+def test_dependency_key():
+    """ Dependency key handles fmf ids with any yaml values """
+    library = {'url': 'https://example.com/lib', 'ref': datetime.date.today()}
+    first = SimpleNamespace(require=['wget', library], recommend=None)
+    second = SimpleNamespace(
+        require=[dict(reversed(list(library.items()))), 'wget'], recommend=[])
+    assert _dependency_key(first) == _dependency_key(second)
+
+
+def test_find_git_root(tmp_path):
+    """ Git root detection for plain repo, .git file, symlink, no repo """
+    tmp_path = tmp_path.resolve()
+    # Plain repository
+    repo = tmp_path / 'repo'
+    (repo / 'sub').mkdir(parents=True)
+    git('init', '--quiet', cwd=repo)
+    assert _find_git_root(str(repo / 'sub')) == str(repo)
+    # Worktree or submodule with the '.git' file
+    worktree = tmp_path / 'worktree'
+    (worktree / 'sub').mkdir(parents=True)
+    (worktree / '.git').write_text(f'gitdir: {repo}/.git\n')
+    assert _find_git_root(str(worktree / 'sub')) == str(worktree)
+    # No repository at all
+    (tmp_path / 'plain').mkdir()
+    assert _find_git_root(str(tmp_path / 'plain')) is None
+    # Symlink from another repository is resolved to the physical path
+    outer = tmp_path / 'outer'
+    (outer / 'inner').mkdir(parents=True)
+    git('init', '--quiet', cwd=outer)
+    (outer / 'inner' / 'link').symlink_to(repo / 'sub')
+    assert _find_git_root(str(outer / 'inner' / 'link')) == str(repo)
+    output = git('rev-parse', '--show-toplevel', cwd=outer / 'inner' / 'link')
+    assert output == str(repo)
+
+
+def test_tar_copy(tmp_path):
+    """ Copy tree using the tar pipe, report failures """
+    plugin = discover(tmp_path)
+    source = tmp_path / 'source'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'sub' / 'file').write_text('content\n')
+    (source / 'link').symlink_to('sub/file')
+    target = tmp_path / 'target'
+    assert plugin._tar_copy(str(source), str(target))
+    assert (target / 'sub' / 'file').read_text() == 'content\n'
+    assert os.readlink(target / 'link') == 'sub/file'
+    # Missing source and existing destination
+    assert not plugin._tar_copy(str(tmp_path / 'missing'), str(tmp_path / 'x'))
+    assert not plugin._tar_copy(str(source), str(target))
+    assert 'Cannot open' in log(plugin)
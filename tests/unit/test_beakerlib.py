@@ -1,5 +1,8 @@
+import os
+import time
 import pytest
 import shutil
+import concurrent.futures
 
 import tmt
 import tmt.beakerlib
@@ -48,3 +51,42 @@ def test_dependencies():
     assert libraries[1].repo == 'openssl'
     assert libraries[1].name == '/certgen'
     shutil.rmtree(parent.workdir)
+
+
+def test_fetch_concurrent(tmp_path):
+    """ Fetch the same library from multiple threads, clone only once """
+    parent = tmt.utils.Common(workdir=str(tmp_path))
+    clones = []
+
+    def run(command, **kwargs):
+        """ Pretend cloning a library repository """
+        if command[:2] == ['git', 'clone']:
+            clones.append(command[2])
+            directory = command[3]
+            time.sleep(0.1)
+            os.makedirs(os.path.join(directory, '.fmf'))
+            with open(os.path.join(directory, '.fmf', 'version'), 'w') as f:
+                f.write('1\n')
+            with open(os.path.join(directory, 'certgen.fmf'), 'w') as f:
+                f.write('require: [openssl]\n')
+        return None, None
+
+    parent.run = run
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [
+            executor.submit(
+                tmt.beakerlib.dependencies,
+                ['library(openssl/certgen)', 'wget'], parent=parent)
+            for _ in range(16)]
+    for future in futures:
+        requires, recommends, libraries = future.result()
+        assert sorted(requires) == ['openssl', 'wget']
+    assert clones == ['https://github.com/beakerlib/openssl']
+
+    # Conflicting url or ref of an already fetched library
+    for identifier in [
+            {'url': 'https://example.com/openssl', 'name': '/certgen'},
+            {'url': 'https://github.com/beakerlib/openssl',
+             'name': '/certgen', 'ref': 'devel'}]:
+        with pytest.raises(tmt.utils.GeneralError, match='conflicts'):
+            tmt.beakerlib.Library(identifier, parent=parent)
@@ -2,6 +2,7 @@
 
 import re
 import os
+import threading
 
 import fmf
 import tmt
@@ -13,6 +14,9 @@ LIBRARY_REGEXP = re.compile(r'^library\(([^/]+)(/[^)]+)\)$')
 DEFAULT_REPOSITORY = 'https://github.com/beakerlib'
 DEFAULT_DESTINATION = 'libs'
 
+# Guard library cache initialization when fetching from multiple threads
+_cache_lock = threading.Lock()
+
 
 class LibraryError(Exception):
     """ Used when library cannot be parsed from the identifier """
@@ -100,10 +104,50 @@ class Library(object):
 
     def fetch(self):
         """ Fetch the library (unless already fetched) """
-        # Initialize library cache (indexed by the repository name)
-        if not hasattr(self.parent, '_library_cache'):
-            self.parent._library_cache = dict()
+        # Initialize library cache (indexed by the repository name) and
+        # per-repository locks so that each repo is fetched only once
+        with _cache_lock:
+            if not hasattr(self.parent, '_library_cache'):
+                self.parent._library_cache = dict()
+                self.parent._library_locks = dict()
+            lock = self.parent._library_locks.setdefault(
+                self.repo, threading.Lock())
+
+        with lock:
+            self._fetch()
+
+        # Get the library node, check require and recommend
+        library = self.tree.find(self.name)
+        if not library:
+            # Fallback to install during the prepare step if in rpm format
+            if self.format == 'rpm':
+                self.parent.debug(
+                    f"Library '{self.name.lstrip('/')}' not found "
+                    f"in the '{self.url}' repo.")
+                raise LibraryError
+            raise tmt.utils.GeneralError(
+                f"Library '{self.name}' not found in '{self.repo}'.")
+        self.require = tmt.utils.listify(library.get('require', []))
+        self.recommend = tmt.utils.listify(library.get('recommend', []))
+
+        # Create a symlink if the library is deep in the structure
+        # FIXME: hot fix for https://github.com/beakerlib/beakerlib/pull/72
+        # Covers also cases when library is stored more than 2 levels deep
+        if os.path.dirname(self.name).lstrip('/'):
+            link = self.name.lstrip('/')
+            path = os.path.join(self.tree.root, os.path.basename(self.name))
+            self.parent.debug(
+                f"Create a '{link}' symlink as the library is stored "
+                f"deep in the directory structure.")
+            try:
+                os.symlink(link, path)
+            except OSError as error:
+                self.parent.warn(
+                    f"Unable to create a '{link}' symlink "
+                    f"for a deep library ({error}).")
 
+    def _fetch(self):
+        """ Clone the library repository unless already in the cache """
         # Check if the library was already fetched
         try:
             library = self.parent._library_cache[self.repo]
@@ -153,36 +197,6 @@ class Library(object):
             self.tree = fmf.Tree(directory)
             self.parent._library_cache[self.repo] = self
 
-        # Get the library node, check require and recommend
-        library = self.tree.find(self.name)
-        if not library:
-            # Fallback to install during the prepare step if in rpm format
-            if self.format == 'rpm':
-                self.parent.debug(
-                    f"Library '{self.name.lstrip('/')}' not found "
-                    f"in the '{self.url}' repo.")
-                raise LibraryError
-            raise tmt.utils.GeneralError(
-                f"Library '{self.name}' not found in '{self.repo}'.")
-        self.require = tmt.utils.listify(library.get('require', []))
-        self.recommend = tmt.utils.listify(library.get('recommend', []))
-
-        # Create a symlink if the library is deep in the structure
-        # FIXME: hot fix for https://github.com/beakerlib/beakerlib/pull/72
-        # Covers also cases when library is stored more than 2 levels deep
-        if os.path.dirname(self.name).lstrip('/'):
-            link = self.name.lstrip('/')
-            path = os.path.join(self.tree.root, os.path.basename(self.name))
-            self.parent.debug(
-                f"Create a '{link}' symlink as the library is stored "
-                f"deep in the directory structure.")
-            try:
-                os.symlink(link, path)
-            except OSError as error:
-                self.parent.warn(
-                    f"Unable to create a '{link}' symlink "
-                    f"for a deep library ({error}).")
-
 
 def dependencies(original_require, original_recommend=None, parent=None):
     """
@@ -1,12 +1,42 @@
 import os
 import click
 import shutil
+import shlex
+import concurrent.futures
 
 import fmf
 import tmt
 import tmt.beakerlib
 import tmt.steps.discover
 
+# Maximum number of tests with library requires handled in parallel
+MAX_WORKERS = 16
+
+
+def _dependency_key(test):
+    """ Hashable key identifying test require and recommend """
+    def item_key(item):
+        # Library fmf identifiers are dictionaries with any yaml values
+        if isinstance(item, dict):
+            return repr(sorted(item.items()))
+        return repr(item)
+    return tuple(
+        tuple(sorted(item_key(item) for item in items))
+        for items in [test.require or [], test.recommend or []])
+
+
+def _find_git_root(path):
+    """ Find git repository root by looking for '.git' in parents """
+    # Use the physical path (symlinks resolved) the same way as git does
+    directory = os.path.realpath(path)
+    while True:
+        if os.path.exists(os.path.join(directory, '.git')):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
 
 class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
     """
@@ -27,6 +57,10 @@ class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
             path: /fmf/root
             test: /tests/basic
             filter: 'tier: 1'
+
+    Use 'shallow: true' to clone only the given branch or tag without
+    any history (commits fall back to the full clone) if the tests do
+    not need to access the git history or other branches.
     """
 
     # Supported methods
@@ -51,6 +85,9 @@ class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
             click.option(
                 '-F', '--filter', metavar='FILTERS', multiple=True,
                 help='Include only tests matching the filter.'),
+            click.option(
+                '-s', '--shallow', is_flag=True,
+                help='Clone only the given ref without git history.'),
             ] + super().options(how)
 
     def default(self, option, default=None):
@@ -63,7 +100,7 @@ class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
 
     def show(self):
         """ Show discover details """
-        super().show(['url', 'ref', 'path', 'test', 'filter'])
+        super().show(['url', 'ref', 'path', 'test', 'filter', 'shallow'])
 
     def wake(self):
         """ Wake up the plugin (override data with command line) """
@@ -80,11 +117,73 @@ class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
                 self.data[key] = [self.data[key]]
 
         # Process command line options, apply defaults
-        for option in ['url', 'ref', 'path', 'test', 'filter']:
+        for option in ['url', 'ref', 'path', 'test', 'filter', 'shallow']:
             value = self.opt(option)
             if value:
                 self.data[option] = value
 
+    def _copy_tree(self, source, destination):
+        """ Copy directory tree, use reflinks if possible """
+        # Reflinks are used on file systems which support them (btrfs,
+        # xfs), otherwise cp falls back to regular copy on its own.
+        # Hardlinks are not used as tests may modify files in place.
+        try:
+            self.run(
+                ['cp', '--reflink=auto', '-a', source, destination],
+                shell=False)
+            return
+        except tmt.utils.RunError:
+            self.debug("Unable to copy using 'cp'.")
+            shutil.rmtree(destination, ignore_errors=True)
+        # Stream the tree through a tar pipe, copy in python as the last
+        # resort only
+        if self._tar_copy(source, destination):
+            return
+        shutil.rmtree(destination, ignore_errors=True)
+        shutil.copytree(source, destination, symlinks=True)
+
+    def _tar_copy(self, source, destination):
+        """ Copy directory tree using a tar pipe, return True on success """
+        # Use bash explicitly as pipefail is not supported by all shells
+        options = '--numeric-owner --same-permissions'
+        script = (
+            f"set -o pipefail; "
+            f"tar -C {shlex.quote(source)} {options} -cf - . | "
+            f"tar -C {shlex.quote(destination)} {options} -xf -")
+        try:
+            os.makedirs(destination)
+            self.run(
+                ['bash', '-c', script], shell=False,
+                message=f"Copy '{source}' to '{destination}' using tar.")
+        except OSError as error:
+            self.debug(f"Unable to copy using tar ({error}).")
+            return False
+        except tmt.utils.RunError:
+            self.debug('Unable to copy using tar.')
+            return False
+        return True
+
+    def _clone(self, url, ref, destination, shallow=False):
+        """
+        Clone the git repository, optionally without the history
+
+        Return True if the requested ref has been already checked out.
+        """
+        # Shallow clone works for branches and tags only, full history
+        # is fetched when the ref cannot be used (e.g. commit hash)
+        if shallow:
+            command = ['git', 'clone', '--depth=1']
+            if ref:
+                command.extend(['--branch', ref])
+            try:
+                self.run(command + [url, destination], shell=False)
+                return True
+            except tmt.utils.RunError:
+                self.debug("Shallow clone failed, fetching full history.")
+                shutil.rmtree(destination, ignore_errors=True)
+        self.run(['git', 'clone', url, destination], shell=False)
+        return not ref
+
     def go(self):
         """ Discover available tests """
         super(DiscoverFmf, self).go()
@@ -92,40 +191,58 @@ class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
         # Check url and path, prepare test directory
         url = self.get('url')
         path = self.get('path')
+        ref = self.get('ref')
+        shallow = self.get('shallow')
+        filters = self.get('filter', [])
+        names = self.get('test', [])
+        dry = self.opt('dry')
         testdir = os.path.join(self.workdir, 'tests')
+        checked_out = False
+        tree_checked = False
 
         # Clone provided git repository (if url given)
         if url:
             self.info('url', url, 'green')
             self.debug(f"Clone '{url}' to '{testdir}'.")
-            self.run(['git', 'clone', url, testdir], shell=False)
+            checked_out = self._clone(url, ref, testdir, shallow)
         # Copy git repository root to workdir
         else:
             if path and not os.path.isdir(path):
                 raise tmt.utils.DiscoverError(
                     f"Provided path '{path}' is not a directory.")
-            fmf_root = path or self.step.plan.run.tree.root
-            # Check git repository root (use fmf root if not found)
-            try:
-                output = self.run(
-                    'git rev-parse --show-toplevel', cwd=fmf_root, dry=True)
-                git_root = output[0].strip('\n')
-            except tmt.utils.RunError:
-                self.debug(f"Git root not found, using '{fmf_root}.'")
-                git_root = fmf_root
+            fmf_root = os.path.realpath(path or self.step.plan.run.tree.root)
+            # Check git repository root (use fmf root if not found), look
+            # for the '.git' entry first to avoid spawning git if possible
+            git_root = _find_git_root(fmf_root)
+            if git_root is None:
+                try:
+                    output = self.run(
+                        'git rev-parse --show-toplevel', cwd=fmf_root,
+                        dry=True)
+                    git_root = output[0].strip('\n')
+                except tmt.utils.RunError:
+                    self.debug(f"Git root not found, using '{fmf_root}.'")
+                    git_root = fmf_root
             # Set path to relative path from the git root to fmf root
             path = os.path.relpath(fmf_root, git_root)
+            # The fmf root is known to exist so there is no need to check
+            # its copy again unless a different ref is going to be used
+            tree_checked = not ref and not path.startswith('..')
             self.info('directory', git_root, 'green')
             self.debug(f"Copy '{git_root}' to '{testdir}'.")
-            if not self.opt('dry'):
-                shutil.copytree(git_root, testdir, symlinks=True)
+            if not dry:
+                self._copy_tree(git_root, testdir)
 
         # Checkout revision if requested
-        ref = self.get('ref')
         if ref:
             self.info('ref', ref, 'green')
-            self.debug(f"Checkout ref '{ref}'.")
-            self.run(['git', 'checkout', '-f', ref], cwd=testdir, shell=False)
+            # No need to run git again if the clone already checked it out
+            if checked_out:
+                self.debug(f"Checkout ref '{ref}' done by the clone.")
+            else:
+                self.debug(f"Checkout ref '{ref}'.")
+                self.run(
+                    ['git', 'checkout', '-f', ref], cwd=testdir, shell=False)
 
         # Adjust path and optionally show
         if path is None or path == '.':
@@ -134,36 +251,65 @@ class DiscoverFmf(tmt.steps.discover.DiscoverPlugin):
             self.info('path', path, 'green')
 
         # Prepare the whole tree path and test path prefix
-        tree_path = os.path.join(testdir, path.lstrip('/'))
-        if not os.path.isdir(tree_path) and not self.opt('dry'):
+        stripped = path.lstrip('/')
+        tree_path = os.path.join(testdir, stripped)
+        if not dry and not tree_checked and not os.path.isdir(tree_path):
             raise tmt.utils.DiscoverError(
                 f"Metadata tree path '{path}' not found.")
-        prefix_path = os.path.join('/tests', path.lstrip('/'))
+        prefix_path = os.path.join('/tests', stripped).rstrip('/')
 
         # Show filters and test names if provided
-        filters = self.get('filter', [])
         for filter_ in filters:
             self.info('filter', filter_, 'green')
-        names = self.get('test', [])
         if names:
             self.info('names', fmf.utils.listed(names), 'green')
 
         # Initialize the metadata tree, search for available tests
         self.debug(f"Check metadata tree in '{tree_path}'.")
-        if self.opt('dry'):
+        if dry:
             self._tests = []
             return
         tree = tmt.Tree(path=tree_path, context=self.step.plan._fmf_context())
         self._tests = tree.tests(filters=filters, names=names)
 
-        # Prefix tests and handle library requires
+        # Prefix test path with 'tests' and possible 'path' prefix
         for test in self._tests:
-            # Prefix test path with 'tests' and possible 'path' prefix
-            test.path = os.path.join(prefix_path, test.path.lstrip('/'))
-            # Check for possible required beakerlib libraries
-            if test.require or test.recommend:
-                test.require, test.recommend, _ = tmt.beakerlib.dependencies(
-                    test.require, test.recommend, parent=self)
+            test.path = f"{prefix_path}/{test.path.lstrip('/')}"
+
+        # Check for possible required beakerlib libraries, fetching them
+        # means network access so handle tests in parallel. Tests often
+        # share the same requires (e.g. a common library) so resolve each
+        # unique combination only once.
+        tests = [
+            test for test in self._tests if test.require or test.recommend]
+        if not tests:
+            return
+        unique = dict()
+        for test in tests:
+            unique.setdefault(
+                _dependency_key(test), (test.require, test.recommend))
+        results = dict()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(MAX_WORKERS, len(unique)))
+        futures = {
+            executor.submit(
+                tmt.beakerlib.dependencies, require, recommend,
+                parent=self): key
+            for key, (require, recommend) in unique.items()}
+        # Stop on the first failure, do not start pending fetches
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                results[futures[future]] = future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            executor.shutdown()
+        # Update tests from the main thread only
+        for test in tests:
+            require, recommend, _ = results[_dependency_key(test)]
+            test.require, test.recommend = list(require), list(recommend)
 
     def tests(self):
         """ Return all discovered tests """